@@ -0,0 +1,225 @@
+# This source code is part of the Biotite package and is distributed
+# under the 3-Clause BSD License. Please see 'LICENSE.rst' for further
+# information.
+
+__name__ = "biotite.structure.io.xyz"
+__author__ = "Benjamin E. Mayer"
+__all__ = ["parse_xyz_block"]
+
+cimport cython
+
+from libc.stdlib cimport strtof, malloc, free
+from libc.string cimport strlen
+from libc.locale cimport localeconv
+
+import numpy as np
+
+
+cdef enum:
+    # Size of the stack buffer for a coordinate value including the
+    # terminating null character, longer values use a heap buffer
+    NUMBER_BUFFER_SIZE = 64
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def parse_xyz_block(list lines, int n_atoms,
+                    float[:, ::1] coord_out, object[:] element_out):
+    """
+    Parse the atom lines of a single model in an XYZ file.
+
+    The parsing itself releases the GIL, so that multiple models can be
+    parsed in parallel threads.
+
+    Parameters
+    ----------
+    lines : list of str
+        The atom lines of the model, i.e. the model lines without the
+        two header lines.
+        The lines may contain a trailing line break.
+    n_atoms : int
+        The number of atoms in the model.
+    coord_out : ndarray, dtype=np.float32, shape=(n,3)
+        The parsed coordinates are written into this array.
+    element_out : ndarray, dtype=object, shape=(n,)
+        The parsed elements are written into this array.
+    """
+    cdef int i
+    cdef int invalid_line
+    cdef bint has_line_breaks
+    cdef bytes data
+    cdef const char* data_ptr
+    cdef bytes decimal_point
+    cdef const char* decimal_point_ptr
+
+    if len(lines) < n_atoms:
+        raise ValueError(
+            f"Expected {n_atoms} atom lines, but got {len(lines)}"
+        )
+    if coord_out.shape[0] < n_atoms or element_out.shape[0] < n_atoms:
+        raise IndexError("Output arrays are too small")
+
+    # Concatenate the lines into a single buffer,
+    # that can be parsed without Python objects
+    data = "\n".join(lines[:n_atoms]).encode("UTF-8")
+    data_ptr = data
+    # Lines read from a file object contain a trailing line break
+    has_line_breaks = n_atoms > 0 and lines[0].endswith("\n")
+    # 'strtof()' depends on the locale, while the XYZ format always
+    # uses '.' as decimal point
+    # -> the decimal point of the current locale is required to
+    # convert the numbers independent of the locale
+    decimal_point = localeconv().decimal_point
+    decimal_point_ptr = decimal_point
+    cdef Py_ssize_t[:] element_start = np.empty(n_atoms, dtype=np.intp)
+    cdef Py_ssize_t[:] element_stop = np.empty(n_atoms, dtype=np.intp)
+
+    with nogil:
+        invalid_line = _parse_lines(
+            data_ptr, decimal_point_ptr, n_atoms, has_line_breaks,
+            coord_out, element_start, element_stop
+        )
+    if invalid_line != -1:
+        raise ValueError(
+            f"Atom line '{lines[invalid_line]}' does not contain "
+            f"an element and valid coordinates"
+        )
+
+    for i in range(n_atoms):
+        element_out[i] = data[element_start[i] : element_stop[i]].decode(
+            "UTF-8"
+        )
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int _parse_lines(const char* data, const char* decimal_point,
+                      int n_atoms, bint has_line_breaks,
+                      float[:, ::1] coord_out,
+                      Py_ssize_t[:] element_start,
+                      Py_ssize_t[:] element_stop) nogil:
+    """
+    Parse the newline separated atom lines in `data`.
+    If `has_line_breaks` is true, each line is additionally terminated
+    by its own line break.
+
+    Returns the index of the first invalid line or -1 if all lines are
+    valid.
+    """
+    cdef int i, k
+    cdef const char* pos = data
+    cdef const char* start
+
+    for i in range(n_atoms):
+        # The element is the first column
+        pos = _skip_whitespace(pos)
+        start = pos
+        while not _is_line_end(pos[0]) and not _is_whitespace(pos[0]):
+            pos += 1
+        if pos == start:
+            return i
+        element_start[i] = start - data
+        element_stop[i] = pos - data
+        # The coordinates are the three following columns
+        for k in range(3):
+            pos = _skip_whitespace(pos)
+            pos = _parse_float(pos, decimal_point, &coord_out[i, k])
+            if pos == NULL:
+                return i
+        # Ignore additional columns
+        while not _is_line_end(pos[0]):
+            pos += 1
+        # Skip the line break to the next line and the trailing line
+        # break of the line itself, if present
+        # Any further line break belongs to an empty line,
+        # which is invalid
+        if pos[0] == b"\n":
+            pos += 1
+        if has_line_breaks and pos[0] == b"\n":
+            pos += 1
+    return -1
+
+
+cdef const char* _parse_float(const char* pos, const char* decimal_point,
+                              float* value) nogil:
+    """
+    Parse the whitespace terminated number starting at `pos` into
+    `value`.
+
+    The number is copied into a buffer, where the '.' is replaced by
+    the decimal point of the current locale, so that the conversion is
+    independent of the locale.
+
+    Returns the position after the number or NULL if the column is not
+    a valid number.
+    """
+    cdef char stack_buffer[NUMBER_BUFFER_SIZE]
+    cdef char* buffer = stack_buffer
+    cdef const char* token_end = pos
+    cdef size_t decimal_point_length = strlen(decimal_point)
+    cdef size_t buffer_size
+    cdef size_t length = 0
+    cdef size_t j
+    cdef char* end
+    cdef bint is_valid = True
+
+    while not _is_whitespace(token_end[0]) and not _is_line_end(token_end[0]):
+        token_end += 1
+    if token_end == pos:
+        return NULL
+    # Each character may be replaced by the decimal point
+    buffer_size = (token_end - pos) * max(decimal_point_length, 1) + 1
+    if buffer_size > NUMBER_BUFFER_SIZE:
+        buffer = <char*> malloc(buffer_size)
+        if buffer == NULL:
+            return NULL
+
+    while pos != token_end:
+        if pos[0] == b".":
+            for j in range(decimal_point_length):
+                buffer[length] = decimal_point[j]
+                length += 1
+        elif _is_number_char(pos[0]):
+            buffer[length] = pos[0]
+            length += 1
+        else:
+            is_valid = False
+            break
+        pos += 1
+    buffer[length] = 0
+
+    if is_valid:
+        value[0] = strtof(buffer, &end)
+        # The entire column must be part of the number
+        is_valid = end == buffer + length
+    if buffer != stack_buffer:
+        free(buffer)
+    if not is_valid:
+        return NULL
+    return pos
+
+
+cdef inline bint _is_number_char(char c) nogil:
+    # Besides digits, signs and exponents, 'nan' and 'inf(inity)' are
+    # also valid numbers
+    return (
+        (c >= b"0" and c <= b"9")
+        or c == b"+" or c == b"-" or c == b"e" or c == b"E"
+        or c == b"n" or c == b"N" or c == b"a" or c == b"A"
+        or c == b"i" or c == b"I" or c == b"f" or c == b"F"
+        or c == b"t" or c == b"T" or c == b"y" or c == b"Y"
+    )
+
+
+cdef inline bint _is_whitespace(char c) nogil:
+    return c == b" " or c == b"\t" or c == b"\r"
+
+
+cdef inline bint _is_line_end(char c) nogil:
+    return c == b"\n" or c == 0
+
+
+cdef inline const char* _skip_whitespace(const char* pos) nogil:
+    while _is_whitespace(pos[0]):
+        pos += 1
+    return pos
@@ -6,14 +6,20 @@ __name__ = "biotite.structure.io.xyz"
 __author__ = "Benjamin E. Mayer"
 __all__ = ["XYZFile"]
 
+import os
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from ...atoms import AtomArray, AtomArrayStack, Atom
-import biotite.structure as struc
+from ...atoms import AtomArray, AtomArrayStack
 from ....file import TextFile
+from ._parse import parse_xyz_block
 
 
 # Number of header lines
 N_HEADER = 2
+# Minimum number of atoms per model for parsing the models in parallel,
+# smaller models are parsed faster sequentially
+_MIN_PARALLEL_ATOMS = 10000
 
 
 class XYZFile(TextFile):
@@ -55,83 +61,160 @@ class XYZFile(TextFile):
         super().__init__()
         # empty header lines
         self.lines = [""] * N_HEADER
-        # internal variables for storing and writing the header
+
+    @property
+    def lines(self):
+        return self._lines
+
+    @lines.setter
+    def lines(self, lines):
+        self._lines = lines
+        # The header and structure information derived from the
+        # previous lines is outdated
         self._mol_names = None
         self._atom_numbers = None
-        self._model_start_inds = None
         self._structures = None
+        # Indicates whether '_model_start_inds' must be recalculated,
+        # as the lines have changed since the last calculation
         self._model_start_inds = None
+        self._start_lines_dirty = True
+
+    @staticmethod
+    def read_streaming(file):
+        """
+        Read the structure from an XYZ file, without storing the lines
+        of the file.
+
+        In contrast to :meth:`read()` followed by
+        :meth:`get_structure()`, each model is parsed directly after
+        its lines have been read from the file.
+        Hence, this static method may save a large amount of memory for
+        files containing many models.
+        The molecule names in the model headers are not retained.
+
+        Note that the number of models is not known before the entire
+        file is read.
+        Hence, the coordinates of all models are copied once more into
+        the final :class:`AtomArrayStack`, so that the coordinates are
+        temporarily held twice in memory.
+
+        Parameters
+        ----------
+        file : file-like object or str
+            The file to be read.
+            Alternatively a file path can be supplied.
+
+        Returns
+        -------
+        array : AtomArray or AtomArrayStack
+            An :class:`AtomArray` if the file contains a single model,
+            otherwise an :class:`AtomArrayStack` containing all models.
+        """
+        line_iter = TextFile.read_iter(file)
+        coord = []
+        # The elements are shared by all models
+        # -> only the elements of the first model are kept
+        element = None
+        for line in line_iter:
+            # Skip empty lines, e.g. at the end of the file
+            if len(line.strip()) == 0:
+                continue
+            n_atoms = int(line)
+            # Skip the molecule name
+            next(line_iter, None)
+            # The line breaks at the end of the lines are handled by
+            # the parser itself
+            atom_lines = list(itertools.islice(line_iter, n_atoms))
+            if len(atom_lines) != n_atoms:
+                raise ValueError(
+                    f"Expected {n_atoms} atom lines, "
+                    f"but the file ended after {len(atom_lines)} lines"
+                )
+            if len(coord) > 0 and n_atoms != coord[0].shape[0]:
+                raise ValueError(
+                    "All models must have the same number of atoms"
+                )
+            model_coord = np.empty((n_atoms, 3), dtype=np.float32)
+            model_element = np.empty(n_atoms, dtype=object)
+            parse_xyz_block(atom_lines, n_atoms, model_coord, model_element)
+            if element is None:
+                element = model_element
+            else:
+                _check_elements(model_element, element, len(coord))
+            coord.append(model_coord)
+
+        if len(coord) == 0:
+            raise ValueError("Trying to read structure from empty XYZ file")
+        # The number of models is unknown beforehand,
+        # so the models are combined after reading the entire file
+        stack = _create_stack(np.stack(coord), element)
+        if stack.stack_depth() == 1:
+            return stack[0]
+        else:
+            return stack
 
     def __update_start_lines(self):
         """
         Internal function that is used to update the _model_start_inds
         private member variable where the indices of where a new
         model within the xyz file read starts is stored.
+        The indices are only recalculated, if the lines have changed
+        since the last call.
         """
-        # Line indices where a new model starts -> where number of atoms
-        # is written down as number
-        self._model_start_inds = np.array(
-            [
-                i for i in range(len(self.lines))
-                if self.lines[i].strip().isdigit()
-            ],
-            dtype=int
-         )
-
-        if self._model_start_inds.shape[0] > 1:
-            # if the mol name line only contains an integer
-            # these lines will appear in model_start_inds
-            # if calculated as above, therfore we purge all
-            # indices that have a distance of 1 to their previous index
-            # (this will not work with a file containing multiple models
-            #  with solely one coordinate / atom per model )
-            self._model_start_inds = self._model_start_inds[
-                np.concatenate(
-                    (
-                        np.array([0], dtype=int),
-                        np.where(
-                            self._model_start_inds[:-1]
-                            -
-                            self._model_start_inds[1:]
-                            !=
-                            -1
-                        )[0]+1
-                    )
-                )
-            ]
-        elif self._model_start_inds.shape[0] == 2:
-            self._model_start_inds = self._model_start_inds[:1]
+        if not self._start_lines_dirty:
+            return
+
+        start_inds, _ = self.__scan_headers()
+        self._model_start_inds = np.array(start_inds, dtype=int)
+
+        self._start_lines_dirty = False
+
+    def __scan_headers(self):
+        """
+        Find the header of each model in the lines.
+
+        As the first line of each model contains its number of atoms,
+        the header of the next model can be found directly, skipping
+        the atom lines.
+        If the lines do not start with a header yet, e.g. before
+        :meth:`set_header()` is called, no header is found.
+
+        Returns
+        -------
+        start_inds : list of int
+            The line index of the first header line of each model.
+        atom_numbers : list of int
+            The number of atoms of each model.
+        """
+        start_inds = []
+        atom_numbers = []
+        if len(self.lines) == 0 or not self.lines[0].strip().isdigit():
+            return start_inds, atom_numbers
+        i = 0
+        while i < len(self.lines):
+            line = self.lines[i].strip()
+            # Skip empty lines, e.g. at the end of the file
+            if len(line) == 0:
+                i += 1
+                continue
+            n_atoms = int(line)
+            start_inds.append(i)
+            atom_numbers.append(n_atoms)
+            i += n_atoms + N_HEADER
+        return start_inds, atom_numbers
 
     def __get_number_of_atoms(self):
         """
-        This calculates the number of atoms from the previously read
-        file.
+        This calculates the number of atoms of each model from the
+        previously read file.
+        If the lines do not start with a header yet, they are treated
+        as a single model and the atoms are counted from the lines
+        after the header.
         """
-        lines_parsed = [x.split() for x in self.lines]
-        # All lines containing less then 4 elements after split() have
-        # to be header lines based upon the structure of an xyz file.
-        inds = np.array(
-            [
-                i for i in range(
-                    len(lines_parsed)
-                ) if len(lines_parsed[i]) != 4
-            ]
-        )
-        print(inds.astype(int))
-        print(np.array(self.lines)[inds.astype(int)])
-        print(inds.shape[0]/2)
-        # If there is only one model contained we can simply count
-        # and return the number of lines after the header.
-        if inds.shape[0] <= 2:
-            return [int(len(self.lines[2:]))]
-        # otherwise if there are multiple models we can get atom
-        # count lines by only considering the first of the two lines
-        # per model
-        else:
-            num_atoms = int(inds.shape[0]/2)
-            inds = np.array([inds[2*i] for i in range(num_atoms)])
-            line_lengths = np.array(self.lines)[inds.astype(int)]
-            return line_lengths
+        _, atom_numbers = self.__scan_headers()
+        if len(atom_numbers) == 0:
+            return [max(len(self.lines) - N_HEADER, 0)]
+        return atom_numbers
 
     def get_model_count(self):
         """
@@ -167,9 +250,7 @@ class XYZFile(TextFile):
         # parse all atom_numbers into integers
         if self._atom_numbers is None:
             self._atom_numbers = [
-                int(
-                    self.lines[i].strip().strip(" ")
-                ) for i in self._model_start_inds
+                int(self.lines[i]) for i in self._model_start_inds
             ]
         # parse all lines containing names
         if self._mol_names is None:
@@ -227,6 +308,7 @@ class XYZFile(TextFile):
             self.lines[0] = str(self.__get_number_of_atoms()[0])
             self._mol_names = [mol_name]
             self._atom_numbers = [int(self.lines[0])]
+            self._start_lines_dirty = True
             self.__update_start_lines()
         else:
             raise ValueError(
@@ -269,57 +351,11 @@ class XYZFile(TextFile):
         if names is None or atom_number is None:
             self.set_header("[MOLNAME]")
         self.__update_start_lines()
-        # parse all atom_numbers into integers
-        if self._atom_numbers is None:
-            self._atom_numbers = [
-                int(
-                    self.lines[i].strip().strip(" ")
-                ) for i in self._model_start_inds
-            ]
-        # parse all lines containing names
-        if self._mol_names is None:
-            self._mol_names = [
-                self.lines[i+1].strip() for i in self._model_start_inds
-            ]
         # parse all coordinates
         if self._structures is None:
-            array_stack = []
-            for i, ind in enumerate(self._model_start_inds):
-                ind_end = ind+2 + self._atom_numbers[i]
-                lines_cut = self.lines[ind:ind_end]
-                array = AtomArray(self._atom_numbers[i])
-                if self._atom_numbers[i]+2 != len(lines_cut):
-                    raise ValueError(
-                        "Number of Atoms not matching with coordinate lines"
-                        + ""
-                        + " atom_number :: " + str(self._atom_numbers[i])
-                        + ""
-                        + ""
-                        + " |lines_cut| :: " + str(len(lines_cut))
-                        + " lines_cut   :: " + str(lines_cut)
-                    )
-
-                for j, line in enumerate(lines_cut[2:]):
-                    line_parsed = [
-                        x for x in line.strip().split(" ") if x != ''
-                    ]
-                    x = float(line_parsed[1])
-                    y = float(line_parsed[2])
-                    z = float(line_parsed[3])
-
-                    if np.isnan(x) or np.isnan(y) or np.isnan(z):
-                        raise ValueError(
-                            "At least one of the coordinates is NaN"
-                            ""
-                            "(" + str(x) + "," + str(y) + "," + str(z) + ")"
-                            ""
-                        )
-                    atom = Atom([x, y, z])
-                    atom.element = line_parsed[0]
-                    array[j] = atom
-
-                array_stack.append(array)
-            self._structures = struc.stack(array_stack)
+            self._structures = _parse_structure(
+                self.lines, self._model_start_inds, self._atom_numbers
+            )
 
         if model is None:
             if self._structures.shape[0] == 1:
@@ -341,32 +377,200 @@ class XYZFile(TextFile):
         atoms : AtomArray, AtomArrayStack
             The array to be saved into this file.
         """
-
         if isinstance(atoms, AtomArray):
             n_atoms = atoms.shape[0]
-            self.lines[0] = str(n_atoms)
-            if len(self.lines[1]) == 0:
-                self.lines[1] = str("[MOLNAME]")
-
-            self.lines += [""] * n_atoms
-            for i, atom in enumerate(atoms):
-                line = "  " + str(atom.element)
-                line += " {:<11.{}f}".format(atom.coord[0], 6)
-                line += "    {:<11.{}f}".format(atom.coord[1], 6)
-                line += "    {:<11.{}f}".format(atom.coord[2], 6)
-                line += " "
-                self.lines[i+2] = line
+            # Keep a molecule name that has been set previously
+            mol_name = self.lines[1] if len(self.lines) > 1 else ""
+            self.lines = [
+                str(n_atoms), mol_name or "[MOLNAME]"
+            ] + _format_atom_lines(
+                atoms.element, atoms.coord, left_align=True
+            ).tolist()
         elif isinstance(atoms, AtomArrayStack):
-            n_lines_per_model = atoms[0].shape[0]+2
-            self.lines += [""] * n_lines_per_model*atoms.shape[0]
-            for i, atoms_i in enumerate(atoms):
-                self.lines[i*n_lines_per_model] = str(atoms[0].shape[0])
-                self.lines[i*n_lines_per_model+1] = " " + str(i)
-                for j, atom in enumerate(atoms_i):
-                    line = "  " + str(atom.element)
-                    print(atom.coord)
-                    line += " {:>11.{}f}".format(atom.coord[0], 6)
-                    line += "    {:>11.{}f}".format(atom.coord[1], 6)
-                    line += "    {:>11.{}f}".format(atom.coord[2], 6)
-                    line += " "
-                    self.lines[i*n_lines_per_model+j+2] = line
+            n_models = atoms.stack_depth()
+            n_atoms = atoms.array_length()
+            n_lines_per_model = n_atoms + N_HEADER
+            # Format the atom lines of all models at once
+            atom_lines = _format_atom_lines(
+                np.tile(atoms.element, n_models),
+                atoms.coord.reshape(-1, 3),
+                left_align=False
+            )
+            model_lines = np.empty(
+                (n_models, n_lines_per_model), dtype=object
+            )
+            model_lines[:, 0] = str(n_atoms)
+            model_lines[:, 1] = [" " + str(i) for i in range(n_models)]
+            model_lines[:, N_HEADER:] = atom_lines.reshape(n_models, n_atoms)
+            # The lines are replaced as a whole,
+            # so no intermediate list of empty lines is required
+            self.lines = model_lines.flatten().tolist()
+
+
+def _parse_structure(lines, model_start_inds, atom_numbers):
+    """
+    Parse all models of an XYZ file into an :class:`AtomArrayStack`.
+
+    Parameters
+    ----------
+    lines : list of str
+        The lines of the file.
+    model_start_inds : ndarray, dtype=int
+        The line index of the first header line of each model.
+    atom_numbers : list of int
+        The number of atoms of each model.
+
+    Returns
+    -------
+    stack : AtomArrayStack
+        The parsed models.
+    """
+    if len(model_start_inds) == 0:
+        raise ValueError("The XYZ file does not contain any model")
+    model_lines = []
+    for i, ind in enumerate(model_start_inds):
+        ind_end = ind+2 + atom_numbers[i]
+        lines_cut = lines[ind:ind_end]
+        if atom_numbers[i]+2 != len(lines_cut):
+            raise ValueError(
+                "Number of Atoms not matching with coordinate lines"
+                + ""
+                + " atom_number :: " + str(atom_numbers[i])
+                + ""
+                + ""
+                + " |lines_cut| :: " + str(len(lines_cut))
+                + " lines_cut   :: " + str(lines_cut)
+            )
+        model_lines.append(lines_cut[2:])
+
+    n_models = len(model_lines)
+    n_atoms = atom_numbers[0]
+    if any(n != n_atoms for n in atom_numbers):
+        raise ValueError(
+            "All models must have the same number of atoms"
+        )
+    # Each model is parsed directly into its part of the stack arrays
+    coord = np.empty((n_models, n_atoms, 3), dtype=np.float32)
+    element = np.empty((n_models, n_atoms), dtype=object)
+    n_workers = os.cpu_count() or 1
+    if n_models > 1 and n_workers > 1 and n_atoms >= _MIN_PARALLEL_ATOMS:
+        # Only the number conversion releases the GIL
+        # -> parallel parsing only pays off for large models
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            # Consume the iterator to propagate exceptions
+            list(pool.map(
+                parse_xyz_block,
+                model_lines, itertools.repeat(n_atoms), coord, element
+            ))
+    else:
+        for i in range(n_models):
+            parse_xyz_block(model_lines[i], n_atoms, coord[i], element[i])
+    for i in range(1, n_models):
+        _check_elements(element[i], element[0], i)
+    return _create_stack(coord, element[0])
+
+
+def _create_stack(coord, element):
+    """
+    Create an :class:`AtomArrayStack` from the parsed coordinates of
+    all models and the elements shared by them.
+
+    Parameters
+    ----------
+    coord : ndarray, dtype=np.float32, shape=(m,n,3)
+        The coordinates of each model.
+    element : ndarray, dtype=object, shape=(n,)
+        The elements of the atoms.
+
+    Returns
+    -------
+    stack : AtomArrayStack
+        The stack containing the models.
+    """
+    _check_nan(coord)
+    stack = AtomArrayStack(coord.shape[0], coord.shape[1])
+    stack.coord = coord
+    stack.element = element
+    return stack
+
+
+def _check_elements(element, ref_element, model_i):
+    """
+    Check whether the elements of a model are equal to the elements of
+    the first model, as the annotations are shared between all models
+    of a stack.
+
+    Parameters
+    ----------
+    element : ndarray, dtype=object, shape=(n,)
+        The elements of the model to be checked.
+    ref_element : ndarray, dtype=object, shape=(n,)
+        The elements of the first model.
+    model_i : int
+        The index of the checked model, used in the error message.
+
+    Raises
+    ------
+    ValueError
+        If the elements differ.
+    """
+    if np.any(element != ref_element):
+        raise ValueError(
+            f"The elements of the model at index {model_i} "
+            f"are not equal to the elements of the model at index 0"
+        )
+
+
+def _check_nan(coord):
+    """
+    Check the coordinates of all models for NaN values at once.
+
+    Parameters
+    ----------
+    coord : ndarray, dtype=float, shape=(m,n,3)
+        The coordinates of the parsed models.
+
+    Raises
+    ------
+    ValueError
+        If any coordinate is NaN.
+    """
+    is_nan = np.isnan(coord)
+    if is_nan.any():
+        model_i, atom_i, _ = np.argwhere(is_nan)[0]
+        raise ValueError(
+            f"At least one of the coordinates is NaN "
+            f"(model {model_i}, atom {atom_i})"
+        )
+
+
+def _format_atom_lines(element, coord, left_align):
+    """
+    Create the atom lines of a model from the given elements and
+    coordinates.
+
+    Parameters
+    ----------
+    element : ndarray, dtype=str, shape=(n,)
+        The element of each atom.
+    coord : ndarray, dtype=float, shape=(n,3)
+        The coordinates of each atom.
+    left_align : bool
+        Whether the coordinates are left or right aligned in their
+        columns.
+
+    Returns
+    -------
+    lines : ndarray, dtype=str, shape=(n,)
+        The formatted atom lines.
+    """
+    coord_format = "%-11.6f" if left_align else "%11.6f"
+    lines = np.char.add("  ", element.astype(str))
+    lines = np.char.add(lines, " ")
+    lines = np.char.add(lines, np.char.mod(coord_format, coord[:, 0]))
+    lines = np.char.add(lines, "    ")
+    lines = np.char.add(lines, np.char.mod(coord_format, coord[:, 1]))
+    lines = np.char.add(lines, "    ")
+    lines = np.char.add(lines, np.char.mod(coord_format, coord[:, 2]))
+    lines = np.char.add(lines, " ")
+    return lines
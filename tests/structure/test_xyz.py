@@ -3,6 +3,7 @@
 # information.
 import itertools
 import datetime
+import locale
 from tempfile import TemporaryFile
 import glob
 from os.path import join, split, splitext
@@ -102,6 +103,22 @@ def test_header_conversion():
         assert atom_numbers == N_sample
 
 
+def test_set_header_without_header():
+    """
+    Setting the header for lines without a header should derive the
+    number of atoms from the number of atom lines.
+    """
+    xyz_file = xyz.XYZFile()
+    xyz_file.lines = ["", "", "C 0 0 0", "H 1 1 1"]
+    assert xyz.get_model_count(xyz_file) == 1
+    xyz.set_header(xyz_file, "Test")
+    assert xyz_file.lines[:2] == ["2", "Test"]
+    atom_number, mol_name = xyz.get_header(xyz_file)
+    assert atom_number == 2
+    assert mol_name == "Test"
+    assert xyz.get_structure(xyz_file).array_length() == 2
+
+
 @pytest.mark.parametrize(
     "path",
     glob.glob(join(data_dir("structure"), "molecules", "*.xyz"))
@@ -221,3 +238,159 @@ def test_get_structure(path):
     else:
         struct = xyz.get_structure(xyz_file)
         assert isinstance(struct, AtomArray)
+
+
+@pytest.mark.parametrize("n_models", [1, 5])
+def test_set_structure_line_count(n_models):
+    """
+    Setting a structure multiple times should replace the previous
+    lines, resulting in exactly one header per model and one line per
+    atom.
+    """
+    N_sample = 10
+    if n_models == 1:
+        atoms = draw_random_struct(N_sample)
+    else:
+        atoms = struc.stack(
+            [draw_random_struct(N_sample) for _ in range(n_models)]
+        )
+    xyz_file = xyz.XYZFile()
+    xyz.set_structure(xyz_file, atoms)
+    xyz.set_structure(xyz_file, atoms)
+    assert len(xyz_file.lines) == n_models * (N_sample + 2)
+    assert xyz.get_model_count(xyz_file) == n_models
+
+
+def test_set_structure_invalidation():
+    """
+    After setting a new structure, the structure and header read
+    previously from the same file must not be returned anymore.
+    """
+    xyz_file = xyz.XYZFile()
+    xyz.set_structure(xyz_file, draw_random_struct(10))
+    xyz.get_structure(xyz_file)
+    ref_atoms = draw_random_struct(20)
+    xyz.set_structure(xyz_file, ref_atoms)
+    test_atoms = xyz.get_structure(xyz_file)
+    atom_number, _ = xyz.get_header(xyz_file)
+    assert atom_number == 20
+    assert np.allclose(test_atoms.coord, ref_atoms.coord, atol=1e-6)
+
+
+def test_model_count_single_atom():
+    """
+    The model count should be derived from the atom number in the
+    header of each model, so that it also works for models with only a
+    single atom.
+    """
+    n_models = 4
+    atoms = struc.stack([draw_random_struct(1) for _ in range(n_models)])
+    xyz_file = xyz.XYZFile()
+    xyz.set_structure(xyz_file, atoms)
+    assert xyz.get_model_count(xyz_file) == n_models
+    atom_numbers, _ = xyz.get_header(xyz_file)
+    assert atom_numbers == [1] * n_models
+    test_atoms = xyz.get_structure(xyz_file)
+    assert test_atoms.stack_depth() == n_models
+    assert np.allclose(test_atoms.coord, atoms.coord, atol=1e-6)
+
+
+@pytest.mark.parametrize(
+    "path",
+    glob.glob(join(data_dir("structure"), "molecules", "*.xyz"))
+)
+def test_read_streaming(path):
+    """
+    Reading the structure directly from the file should give the same
+    structure as reading the file first and getting the structure
+    afterwards.
+    """
+    ref_atoms = xyz.get_structure(xyz.XYZFile.read(path))
+    test_atoms = xyz.XYZFile.read_streaming(path)
+    assert test_atoms == ref_atoms
+
+
+def test_lines_invalidation():
+    """
+    After reassigning the lines of a file, the structure and header
+    read from the previous lines must not be returned anymore.
+    """
+    xyz_file = xyz.XYZFile()
+    xyz_file.lines = ["2", "Old", "C 0 0 0", "H 1 1 1"]
+    xyz.get_structure(xyz_file)
+    xyz_file.lines = ["1", "New", "O 5 5 5"]
+    atoms = xyz.get_structure(xyz_file)
+    assert atoms.element.tolist() == ["O"]
+    assert atoms.coord.tolist() == [[5, 5, 5]]
+    assert xyz.get_header(xyz_file) == (1, "New")
+
+
+@pytest.mark.parametrize(
+    "atom_line", ["C 1.5abc 0 0", "C 1,5 0 0", "C 0x1 0 0", "C 0 0"]
+)
+def test_invalid_coordinates(atom_line):
+    """
+    Atom lines with a coordinate column that is not entirely a number
+    should raise an exception instead of being partially parsed.
+    """
+    xyz_file = xyz.XYZFile()
+    xyz_file.lines = ["2", "Test", "C 0 0 0", atom_line]
+    with pytest.raises(ValueError):
+        xyz.get_structure(xyz_file)
+
+
+def test_empty_atom_line():
+    """
+    An empty atom line should be reported as invalid line, instead of
+    being skipped.
+    """
+    lines = ["3", "Test", "C 0 0 0", "", "C 1 1 1"]
+    xyz_file = xyz.XYZFile()
+    xyz_file.lines = lines
+    with pytest.raises(ValueError, match="Atom line ''"):
+        xyz.get_structure(xyz_file)
+
+    temp = TemporaryFile("w+")
+    temp.write("\n".join(lines) + "\n")
+    temp.seek(0)
+    with pytest.raises(ValueError, match="Atom line '\n'"):
+        xyz.XYZFile.read_streaming(temp)
+    temp.close()
+
+
+def test_long_coordinates():
+    """
+    Coordinates with more characters than fit into the internal number
+    buffer of the parser, e.g. due to zero padding, should still be
+    parsed.
+    """
+    xyz_file = xyz.XYZFile()
+    xyz_file.lines = [
+        "2", "Test",
+        "C 0 0 0",
+        "C " + "0" * 100 + "1.5 " + "-" + "0" * 100 + "2." + "0" * 100 + " 3"
+    ]
+    atoms = xyz.get_structure(xyz_file)
+    assert atoms.coord[1].tolist() == [1.5, -2.0, 3.0]
+
+
+@pytest.mark.parametrize(
+    "locale_name", ["de_DE.UTF-8", "de_DE", "fr_FR.UTF-8"]
+)
+def test_locale_independence(locale_name):
+    """
+    The coordinates should be parsed equally, even if the locale uses
+    a different decimal point.
+    """
+    path = join(data_dir("structure"), "molecules", "CO2.xyz")
+    ref_atoms = xyz.get_structure(xyz.XYZFile.read(path))
+    prev_locale = locale.setlocale(locale.LC_NUMERIC)
+    try:
+        locale.setlocale(locale.LC_NUMERIC, locale_name)
+    except locale.Error:
+        pytest.skip(f"Locale '{locale_name}' is not available")
+    try:
+        test_atoms = xyz.XYZFile.read_streaming(path)
+    finally:
+        locale.setlocale(locale.LC_NUMERIC, prev_locale)
+    assert test_atoms == ref_atoms